@@ -2,6 +2,7 @@ from flask import Flask, request, jsonify
 import json
 import os
 import sys
+import threading
 
 # --- GOOGLE API IMPORTS ---
 import io
@@ -36,37 +37,65 @@ def log_to_stderr(message):
 SERVICE_ACCOUNT_FILE = 'C:/Users/clcas/ttb/exclude/service_account_key.json' 
 DRIVE_SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
 
-try:
-    # Load credentials explicitly for LOCAL TESTING
-    creds = service_account.Credentials.from_service_account_file(
-        SERVICE_ACCOUNT_FILE, scopes=DRIVE_SCOPES)
-    DRIVE_SERVICE = build('drive', 'v3', credentials=creds) 
-    log_to_stderr("DEBUG: Running in LOCAL mode with Service Account credentials.")
-
-except FileNotFoundError:
-    # This block handles the Cloud Run scenario where the file is absent, 
-    # and default application credentials (from the Service Account role) are used.
-    log_to_stderr("DEBUG: Service Account file not found. Assuming Cloud Run or default environment auth.")
-    from google.auth import default as google_default_auth
+# 2. Drive API Endpoint Override (Only used for load testing against a fake Drive server)
+# Example: DRIVE_API_ENDPOINT=http://127.0.0.1:8090/drive/v3/
+DRIVE_API_ENDPOINT = os.environ.get('DRIVE_API_ENDPOINT')
+
+DRIVE_CLIENT_OPTIONS = None
+
+if DRIVE_API_ENDPOINT:
+    from google.auth.credentials import AnonymousCredentials
+
+    creds = AnonymousCredentials()
+    DRIVE_CLIENT_OPTIONS = {'api_endpoint': DRIVE_API_ENDPOINT}
+    log_to_stderr(f"DEBUG: Using Drive API endpoint override: {DRIVE_API_ENDPOINT}")
+
+else:
+    try:
+        # Load credentials explicitly for LOCAL TESTING
+        creds = service_account.Credentials.from_service_account_file(
+            SERVICE_ACCOUNT_FILE, scopes=DRIVE_SCOPES)
+        log_to_stderr("DEBUG: Running in LOCAL mode with Service Account credentials.")
+
+    except FileNotFoundError:
+        # This block handles the Cloud Run scenario where the file is absent, 
+        # and default application credentials (from the Service Account role) are used.
+        log_to_stderr("DEBUG: Service Account file not found. Assuming Cloud Run or default environment auth.")
+        from google.auth import default as google_default_auth
     
-    # Use default auth for Cloud Run environment
-    creds, _ = google_default_auth(scopes=DRIVE_SCOPES)
-    DRIVE_SERVICE = build('drive', 'v3', credentials=creds)
+        # Use default auth for Cloud Run environment
+        creds, _ = google_default_auth(scopes=DRIVE_SCOPES)
+
+# 3. Drive Service (one per thread)
+# The Drive client's httplib2 transport is not thread-safe, so every request
+# thread (gunicorn --threads, or the in-process load test) builds and reuses its own.
+_drive_local = threading.local()
+
+def get_drive_service():
+    """Returns the calling thread's Drive v3 service, building it on first use."""
+    service = getattr(_drive_local, 'service', None)
+    if service is None:
+        service = build('drive', 'v3', credentials=creds, client_options=DRIVE_CLIENT_OPTIONS)
+        _drive_local.service = service
+    return service
 
 
 # --- GOOGLE DRIVE DOWNLOAD FUNCTION ---
 
-def download_image_to_buffer(image_link):
-    """Downloads the image from a Drive URL into an in-memory buffer (io.BytesIO)."""
-    
+def extract_drive_file_id(image_link):
+    """Pulls the Drive file ID out of an 'open?id=' style link."""
     match = re.search(r'id=([A-Za-z0-9_-]+)', image_link)
     if not match:
         raise ValueError(f"Invalid Drive URL format received: {image_link}")
 
-    file_id = match.group(1)
+    return match.group(1)
+
+
+def download_image_to_buffer(file_id):
+    """Downloads a Drive file into an in-memory buffer (io.BytesIO)."""
     
     try:
-        request = DRIVE_SERVICE.files().get_media(fileId=file_id)
+        request = get_drive_service().files().get_media(fileId=file_id)
         fh = io.BytesIO()
         downloader = MediaIoBaseDownload(fh, request)
         done = False
@@ -167,6 +196,29 @@ def process_label_data(original_image):
     return results
 
 
+# --- Shared Pipeline (Webhook and Drive Ingestion) ---
+
+def process_drive_image(file_id):
+    """Downloads a Drive image and runs the CV/OCR pipeline on it. Raises on failure."""
+    # Step 1: Download image from Drive into a memory buffer
+    image_buffer = download_image_to_buffer(file_id)
+    buffer_bytes = image_buffer.getvalue()
+    log_to_stderr(f"DEBUG: Download successful. Buffer size: {len(buffer_bytes)} bytes.")
+
+    # Step 2: Decode the buffer bytes into an OpenCV image array
+    image_bytes = np.frombuffer(buffer_bytes, np.uint8)
+    original_image = cv2.imdecode(image_bytes, cv2.IMREAD_COLOR)
+
+    if original_image is None:
+         raise ValueError("OpenCV failed to decode the downloaded image.")
+    
+    # Step 3: Run the full CV/OCR processing pipeline
+    final_data = process_label_data(original_image)
+    log_to_stderr(f"DEBUG: Extracted Data: {final_data}")
+
+    return final_data
+
+
 # --- Webhook Handler (Main Entry Point) ---
 
 def process_new_submission(row_number, submission_values):
@@ -182,21 +234,8 @@ def process_new_submission(row_number, submission_values):
     log_to_stderr(f"DEBUG: Image Link: {image_link}")
 
     try:
-        # Step 1: Download image from Drive into a memory buffer
-        image_buffer = download_image_to_buffer(image_link)
-        buffer_bytes = image_buffer.getvalue()
-        log_to_stderr(f"DEBUG: Download successful. Buffer size: {len(buffer_bytes)} bytes.")
-
-        # Step 2: Decode the buffer bytes into an OpenCV image array
-        image_bytes = np.frombuffer(buffer_bytes, np.uint8)
-        original_image = cv2.imdecode(image_bytes, cv2.IMREAD_COLOR)
-
-        if original_image is None:
-             raise ValueError("OpenCV failed to decode the downloaded image.")
-        
-        # Step 3: Run the full CV/OCR processing pipeline
-        final_data = process_label_data(original_image)
-        log_to_stderr(f"DEBUG: Extracted Data: {final_data}")
+        file_id = extract_drive_file_id(image_link)
+        final_data = process_drive_image(file_id)
 
         # You would typically send this data to a database or verification system here.
         
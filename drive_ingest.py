@@ -0,0 +1,351 @@
+"""
+Drive ingestion worker: an alternative to the per-row Apps Script webhook.
+
+Instead of one Apps Script call and one Cloud Run request per form
+submission, this worker polls Drive for new uploads and runs them through
+the same pipeline the webhook uses (app.process_drive_image). Submissions
+whose webhook was never delivered are picked up on the next poll.
+
+Two modes:
+    changes  Reads the Drive Changes API. The page token is checkpointed in
+             the state file, so each poll only sees changes since the last.
+             A fresh state file starts at the current feed position.
+    folder   Lists the upload folder ordered by modifiedTime, resuming from
+             the newest modifiedTime already seen. A fresh state file
+             backfills the whole folder, and also records the current change
+             feed position first so a later switch to changes mode has no gap.
+
+File metadata comes back in pages of --batch-size. Files already processed
+are skipped, new ones are processed by --concurrency threads, and failed ones
+are retried once per poll up to --max-attempts attempts. Files that run out of
+attempts are kept in the state file's given_up list; --redrive-given-up queues
+them again.
+
+The processed-ID list used for deduplication stays bounded. Folder mode only
+keeps IDs at the modifiedTime checkpoint. Changes mode keeps IDs modified
+within --dedupe-window-hours of the newest processed file, and ignores older
+files the feed reports again (e.g. after a rename).
+
+Usage:
+    python drive_ingest.py --mode changes --folder-id <FOLDER_ID> --interval 60
+    python drive_ingest.py --mode folder --folder-id <FOLDER_ID> --once
+
+Against the local Drive stand-in:
+    python fake_drive.py --images ./exclude/labels --port 8090
+    DRIVE_API_ENDPOINT=http://127.0.0.1:8090/drive/v3/ python drive_ingest.py --mode folder --folder-id uploads --once
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from app import get_drive_service, log_to_stderr, process_drive_image
+
+FILE_FIELDS = 'id, name, mimeType, parents, modifiedTime, trashed'
+CHANGE_FIELDS = f"nextPageToken, newStartPageToken, changes(fileId, removed, file({FILE_FIELDS}))"
+DEFAULT_DEDUPE_WINDOW_HOURS = 24
+
+
+def parse_drive_time(value):
+    """Parses an RFC 3339 modifiedTime such as '2024-05-01T12:00:00.000Z'."""
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def format_drive_time(dt):
+    """Formats a datetime like Drive does, so the strings compare in time order."""
+    return dt.strftime('%Y-%m-%dT%H:%M:%S.') + f"{dt.microsecond // 1000:03d}Z"
+
+
+# --- CHECKPOINT STATE ---
+
+class IngestState:
+    """Checkpoint kept in a local JSON file between polls and restarts.
+
+    processed maps file ID -> modifiedTime for deduplication. failed and
+    given_up map file ID -> {'attempts': n, 'modifiedTime': t}.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.page_token = None
+        self.modified_since = None
+        self.processed = {}
+        self.failed = {}
+        self.given_up = {}
+
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.page_token = data.get('page_token')
+            self.modified_since = data.get('modified_since')
+            self.processed = data.get('processed', {})
+            self.failed = data.get('failed', {})
+            self.given_up = data.get('given_up', {})
+
+    def is_known(self, file_id):
+        return file_id in self.processed or file_id in self.given_up
+
+    def prune_processed(self, cutoff):
+        """Forgets processed IDs modified before cutoff; they can no longer be listed again."""
+        self.processed = {file_id: modified for file_id, modified in self.processed.items()
+                          if modified >= cutoff}
+
+    def redrive_given_up(self):
+        """Moves abandoned files back into the retry queue with a fresh attempt count."""
+        for file_id, entry in self.given_up.items():
+            self.failed[file_id] = {'attempts': 0, 'modifiedTime': entry.get('modifiedTime', '')}
+        count = len(self.given_up)
+        self.given_up = {}
+        return count
+
+    def save(self):
+        """Writes the checkpoint atomically so a crash never leaves a half-written file."""
+        data = {
+            'page_token': self.page_token,
+            'modified_since': self.modified_since,
+            'processed': self.processed,
+            'failed': self.failed,
+            'given_up': self.given_up,
+        }
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+# --- PIPELINE DISPATCH ---
+
+def is_candidate(file, folder_id):
+    """True for non-trashed images directly inside folder_id."""
+    if file.get('trashed'):
+        return False
+    if not file.get('mimeType', '').startswith('image/'):
+        return False
+    if folder_id not in file.get('parents', []):
+        return False
+    return True
+
+
+def process_file(file):
+    log_to_stderr(f"--- START PROCESSING FILE {file.get('name', file['id'])} ({file['id']}) ---")
+    try:
+        final_data = process_drive_image(file['id'])
+
+        # You would typically send this data to a database or verification system here.
+
+        log_to_stderr(f"Successfully processed file {file['id']}. Extracted Brand: {final_data['brand']}, ABV: {final_data['abv']}%")
+        return True
+
+    except Exception as e:
+        log_to_stderr(f"FAILURE during image processing for file {file['id']}: {e}")
+        return False
+
+
+def process_batch(files, state, pool, max_attempts, retry=False):
+    """Runs unseen files through the pipeline and records the outcome. Returns the success count.
+
+    Files waiting in state.failed are skipped unless retry is set, so a
+    failure is attempted once per poll (by retry_failed) even when the
+    listing returns it again.
+    """
+    new_files = []
+    seen = set()
+    for file in files:
+        if state.is_known(file['id']) or file['id'] in seen:
+            continue
+        if file['id'] in state.failed and not retry:
+            continue
+        seen.add(file['id'])
+        new_files.append(file)
+
+    if not new_files:
+        return 0
+
+    outcomes = list(pool.map(process_file, new_files))
+
+    succeeded = 0
+    for file, ok in zip(new_files, outcomes):
+        file_id = file['id']
+        modified = file.get('modifiedTime', '')
+        if ok:
+            state.processed[file_id] = modified
+            state.failed.pop(file_id, None)
+            succeeded += 1
+            continue
+
+        attempts = state.failed.get(file_id, {}).get('attempts', 0) + 1
+        entry = {'attempts': attempts, 'modifiedTime': modified}
+        state.failed.pop(file_id, None)
+        if attempts >= max_attempts:
+            log_to_stderr(f"ERROR: Giving up on file {file_id} after {attempts} attempts.")
+            state.given_up[file_id] = entry
+        else:
+            state.failed[file_id] = entry
+
+    return succeeded
+
+
+def retry_failed(state, pool, max_attempts):
+    """Re-runs files that failed on an earlier poll; the checkpoint has already moved past them."""
+    if not state.failed:
+        return 0
+    log_to_stderr(f"DEBUG: Retrying {len(state.failed)} previously failed file(s).")
+    files = [{'id': file_id, 'modifiedTime': entry['modifiedTime']} for file_id, entry in state.failed.items()]
+    succeeded = process_batch(files, state, pool, max_attempts, retry=True)
+    state.save()
+    return succeeded
+
+
+# --- POLLING MODES ---
+
+def record_start_page_token(service, state):
+    """Saves the current change feed position as the checkpoint."""
+    response = service.changes().getStartPageToken(supportsAllDrives=True).execute()
+    state.page_token = response['startPageToken']
+    state.save()
+
+
+def changes_dedupe_cutoff(state, window):
+    """Oldest modifiedTime still deduplicated in changes mode, or None before anything is processed."""
+    if not state.processed:
+        return None
+    newest = max(state.processed.values())
+    if not newest:
+        return None
+    return format_drive_time(parse_drive_time(newest) - window)
+
+
+def poll_changes(service, state, folder_id, batch_size, pool, max_attempts, window):
+    """Processes every change since the checkpointed page token."""
+    if state.page_token is None:
+        record_start_page_token(service, state)
+        log_to_stderr(f"DEBUG: No checkpoint found. Starting change feed at token {state.page_token}; "
+                      "run once with --mode folder to backfill existing uploads.")
+        return 0
+
+    succeeded = 0
+    page_token = state.page_token
+    while page_token:
+        response = service.changes().list(
+            pageToken=page_token, pageSize=batch_size, fields=CHANGE_FIELDS, spaces='drive',
+            includeRemoved=False, supportsAllDrives=True, includeItemsFromAllDrives=True).execute()
+
+        files = [change['file'] for change in response.get('changes', [])
+                 if not change.get('removed') and 'file' in change and is_candidate(change['file'], folder_id)]
+
+        # Files older than the dedupe window may already have been processed and
+        # pruned; a change to them (rename, sharing) must not re-run the pipeline.
+        cutoff = changes_dedupe_cutoff(state, window)
+        if cutoff:
+            stale = [file for file in files if file.get('modifiedTime', '') < cutoff]
+            if stale:
+                log_to_stderr(f"DEBUG: Ignoring {len(stale)} change(s) to files modified before {cutoff}.")
+            files = [file for file in files if file.get('modifiedTime', '') >= cutoff]
+
+        succeeded += process_batch(files, state, pool, max_attempts)
+
+        cutoff = changes_dedupe_cutoff(state, window)
+        if cutoff:
+            state.prune_processed(cutoff)
+
+        # Checkpoint only after the page is processed so a crash replays it rather than losing it
+        page_token = response.get('nextPageToken')
+        state.page_token = page_token or response['newStartPageToken']
+        state.save()
+
+    return succeeded
+
+
+def poll_folder(service, state, folder_id, batch_size, pool, max_attempts):
+    """Processes folder uploads modified at or after the checkpointed modifiedTime."""
+    if state.page_token is None:
+        # Take the change feed position before listing, so a later switch to
+        # --mode changes also sees uploads that land while this listing runs.
+        record_start_page_token(service, state)
+
+    query = f"'{folder_id}' in parents and trashed = false and mimeType contains 'image/'"
+    if state.modified_since:
+        # '>=' rather than '>' so uploads sharing the checkpoint timestamp are not missed;
+        # the processed set filters out the ones already handled.
+        query += f" and modifiedTime >= '{state.modified_since}'"
+
+    succeeded = 0
+    page_token = None
+    while True:
+        response = service.files().list(
+            q=query, orderBy='modifiedTime', pageSize=batch_size, pageToken=page_token,
+            fields=f"nextPageToken, files({FILE_FIELDS})",
+            supportsAllDrives=True, includeItemsFromAllDrives=True).execute()
+
+        files = response.get('files', [])
+        succeeded += process_batch(files, state, pool, max_attempts)
+
+        if files:
+            newest = max(file['modifiedTime'] for file in files)
+            state.modified_since = max(state.modified_since or '', newest)
+            # Only IDs at the checkpoint timestamp can be returned by the next '>=' listing
+            state.prune_processed(state.modified_since)
+        state.save()
+
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return succeeded
+
+
+def run_once(mode, state, folder_id, batch_size, pool, max_attempts,
+             dedupe_window_hours=DEFAULT_DEDUPE_WINDOW_HOURS):
+    """Runs one poll. pool is the worker's long-lived executor, so its threads
+    keep their Drive services (app.get_drive_service) between pages and polls."""
+    service = get_drive_service()
+    succeeded = retry_failed(state, pool, max_attempts)
+    if mode == 'changes':
+        succeeded += poll_changes(service, state, folder_id, batch_size, pool, max_attempts,
+                                  timedelta(hours=dedupe_window_hours))
+    else:
+        succeeded += poll_folder(service, state, folder_id, batch_size, pool, max_attempts)
+    log_to_stderr(f"DEBUG: Poll complete. Processed {succeeded} new file(s); {len(state.failed)} pending retry; "
+                  f"{len(state.given_up)} given up.")
+    return succeeded
+
+
+# --- MAIN EXECUTION BLOCK ---
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Ingest new form uploads from Google Drive.')
+    parser.add_argument('--mode', choices=['changes', 'folder'], default='changes')
+    parser.add_argument('--folder-id', required=True, help="Drive folder the form uploads into")
+    parser.add_argument('--state', default='ingest_state.json', help="Local checkpoint file")
+    parser.add_argument('--batch-size', type=int, default=100, help="Files/changes fetched per metadata page")
+    parser.add_argument('--concurrency', type=int, default=4, help="Images processed in parallel")
+    parser.add_argument('--max-attempts', type=int, default=3, help="Attempts per file before giving up")
+    parser.add_argument('--interval', type=float, default=60, help="Seconds between polls")
+    parser.add_argument('--dedupe-window-hours', type=float, default=DEFAULT_DEDUPE_WINDOW_HOURS,
+                        help="Changes mode: how far behind the newest processed file IDs are remembered")
+    parser.add_argument('--redrive-given-up', action='store_true',
+                        help="Queue files that ran out of attempts for another round of retries")
+    parser.add_argument('--once', action='store_true', help="Run a single poll and exit")
+    args = parser.parse_args()
+
+    state = IngestState(args.state)
+    if args.redrive_given_up:
+        log_to_stderr(f"DEBUG: Re-driving {state.redrive_given_up()} given-up file(s).")
+        state.save()
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        while True:
+            try:
+                run_once(args.mode, state, args.folder_id, args.batch_size, pool, args.max_attempts,
+                         args.dedupe_window_hours)
+            except Exception as e:
+                log_to_stderr(f"FATAL ERROR during Drive poll: {e}")
+                if args.once:
+                    raise
+
+            if args.once:
+                break
+            try:
+                time.sleep(args.interval)
+            except KeyboardInterrupt:
+                break
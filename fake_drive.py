@@ -0,0 +1,249 @@
+"""
+Local stand-in for the parts of the Drive v3 API this project uses.
+
+Serves images from a directory as if they were uploads in a single Drive
+folder. Supported endpoints:
+    GET .../files/<id>?alt=media        file content
+    GET .../files/<id>                  file metadata
+    GET .../files?q=...                 folder listing ('in parents', modifiedTime filters)
+    GET .../changes/startPageToken      current change feed position
+    GET .../changes?pageToken=N         change feed page
+
+The directory is rescanned on every request, so copying a new image into it
+shows up as a new file in listings and a new entry in the change feed.
+
+Point the app at it with DRIVE_API_ENDPOINT=http://127.0.0.1:<port>/drive/v3/
+
+Usage:
+    python fake_drive.py --images ./exclude/labels --port 8090 --latency-ms 150
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+DEFAULT_FOLDER_ID = 'uploads'
+DEFAULT_PAGE_SIZE = 100
+
+
+def rfc3339(timestamp):
+    """Formats a POSIX timestamp the way Drive reports modifiedTime."""
+    dt = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    return dt.strftime('%Y-%m-%dT%H:%M:%S.') + f"{dt.microsecond // 1000:03d}Z"
+
+
+class FakeDriveHandler(BaseHTTPRequestHandler):
+    """Routes Drive v3 GET requests to the server's image directory."""
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        drive = self.server
+
+        time.sleep(drive.sample_latency())
+
+        if drive.error_rate and random.random() < drive.error_rate:
+            self.send_error(503, 'Injected Drive failure')
+            return
+
+        drive.rescan()
+
+        if url.path.endswith('/changes/startPageToken'):
+            self.send_json({'kind': 'drive#startPageToken', 'startPageToken': str(len(drive.change_log))})
+            return
+
+        if url.path.endswith('/changes'):
+            self.send_json(drive.list_changes(params))
+            return
+
+        if url.path.endswith('/files'):
+            self.send_json(drive.list_files(params))
+            return
+
+        # IDs are file names without extension, so they may contain spaces,
+        # dots or other characters the client percent-encodes
+        match = re.search(r'/files/([^/]+)$', unquote(url.path))
+        if not match:
+            self.send_error(404, 'Unknown Drive path')
+            return
+
+        file_id = match.group(1)
+        if params.get('alt') == 'media':
+            self.send_media(drive.resolve(file_id))
+        elif file_id in drive.files:
+            self.send_json(drive.files[file_id])
+        else:
+            self.send_error(404, 'File not found')
+
+    def send_json(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_media(self, file_path):
+        if file_path is None:
+            self.send_error(404, 'File not found')
+            return
+
+        with open(file_path, 'rb') as f:
+            body = f.read()
+
+        content_type = 'image/png' if file_path.lower().endswith('.png') else 'image/jpeg'
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Silence per-request access logs; they swamp the report
+        pass
+
+
+class FakeDriveServer(ThreadingHTTPServer):
+    """Serves an image directory as one Drive folder with a change feed.
+
+    File IDs are image file names without extension. Media requests for
+    unknown IDs, e.g. from recorded production payloads, fall back to a
+    stable pick from the directory so replays still exercise the full CV/OCR
+    pipeline. Page tokens are plain offsets into the change log or listing.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, image_dir, latency_ms=0, jitter_ms=0, error_rate=0.0, port=0,
+                 folder_id=DEFAULT_FOLDER_ID):
+        super().__init__(('127.0.0.1', port), FakeDriveHandler)
+        self.image_dir = image_dir
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.folder_id = folder_id
+        self.images = {}
+        self.files = {}
+        self.change_log = []
+        self._lock = threading.Lock()
+        self.rescan()
+        if not self.images:
+            raise ValueError(f"No images found in {image_dir}")
+
+    @property
+    def endpoint(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/drive/v3/"
+
+    def sample_latency(self):
+        jitter = random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+        return max(0.0, self.latency_ms + jitter) / 1000.0
+
+    def rescan(self):
+        """Picks up new or modified images and appends them to the change log."""
+        with self._lock:
+            found = []
+            for name in os.listdir(self.image_dir):
+                stem, ext = os.path.splitext(name)
+                if ext.lower() not in IMAGE_EXTENSIONS:
+                    continue
+                path = os.path.join(self.image_dir, name)
+                modified = rfc3339(os.path.getmtime(path))
+                known = self.files.get(stem)
+                if known is None or known['modifiedTime'] != modified:
+                    found.append((modified, stem, name, path))
+
+            for modified, stem, name, path in sorted(found):
+                self.images[stem] = path
+                self.files[stem] = {
+                    'kind': 'drive#file',
+                    'id': stem,
+                    'name': name,
+                    'mimeType': 'image/png' if name.lower().endswith('.png') else 'image/jpeg',
+                    'parents': [self.folder_id],
+                    'modifiedTime': modified,
+                    'trashed': False,
+                }
+                self.change_log.append(stem)
+
+            self._ordered = [self.images[k] for k in sorted(self.images)]
+
+    def resolve(self, file_id):
+        if file_id in self.images:
+            return self.images[file_id]
+        if not self._ordered:
+            return None
+        return self._ordered[sum(file_id.encode()) % len(self._ordered)]
+
+    def list_changes(self, params):
+        start = int(params.get('pageToken', 0))
+        page_size = int(params.get('pageSize', DEFAULT_PAGE_SIZE))
+        with self._lock:
+            end = min(start + page_size, len(self.change_log))
+            changes = []
+            for file_id in self.change_log[start:end]:
+                file = self.files[file_id]
+                changes.append({'kind': 'drive#change', 'changeType': 'file', 'removed': False,
+                                'fileId': file_id, 'time': file['modifiedTime'], 'file': dict(file)})
+            response = {'kind': 'drive#changeList', 'changes': changes}
+            if end < len(self.change_log):
+                response['nextPageToken'] = str(end)
+            else:
+                response['newStartPageToken'] = str(len(self.change_log))
+        return response
+
+    def list_files(self, params):
+        query = params.get('q', '')
+        start = int(params.get('pageToken', 0))
+        page_size = int(params.get('pageSize', DEFAULT_PAGE_SIZE))
+
+        parent = re.search(r"'([^']+)' in parents", query)
+        since = re.search(r"modifiedTime (>=|>) '([^']+)'", query)
+
+        with self._lock:
+            files = sorted(self.files.values(), key=lambda f: (f['modifiedTime'], f['id']))
+        if parent:
+            files = [f for f in files if parent.group(1) in f['parents']]
+        if since:
+            op, value = since.groups()
+            files = [f for f in files if f['modifiedTime'] > value or (op == '>=' and f['modifiedTime'] == value)]
+
+        response = {'kind': 'drive#fileList', 'files': [dict(f) for f in files[start:start + page_size]]}
+        if start + page_size < len(files):
+            response['nextPageToken'] = str(start + page_size)
+        return response
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+
+# --- MAIN EXECUTION BLOCK ---
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for the Drive v3 API.')
+    parser.add_argument('--images', required=True, help="Directory of label images to serve")
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--folder-id', default=DEFAULT_FOLDER_ID)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeDriveServer(args.images, args.latency_ms, args.jitter_ms, args.error_rate,
+                             args.port, args.folder_id)
+    sys.stderr.write(f"Fake Drive serving {args.images} at {server.endpoint} (folder '{args.folder_id}')\n")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,499 @@
+"""
+Replay-based load test for the /new_submission_hook webhook.
+
+Replays recorded or synthetic {row, data} payloads against app:app at a fixed
+open-loop arrival rate, either in-process (Flask test client) or under
+gunicorn, while a local fake Drive server serves images from disk with
+configurable latency. Reports latency percentiles, error/timeout rates and
+achieved throughput for each offered rate so --workers/--threads can be sized
+from data.
+
+Examples:
+    python load_test.py --mode inprocess --rates 1,2,4 --duration 30
+    python load_test.py --mode gunicorn --configs 1x8,2x4,4x2 --rates 2,4,8,16
+    python load_test.py --payloads recorded.jsonl --images ./exclude/labels
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_drive import FakeDriveServer
+
+HOOK_PATH = '/new_submission_hook'
+
+# Same field position process_new_submission reads the Drive link from
+IMAGE_LINK_INDEX = 7
+
+
+def log_message(message):
+    """Writes a message to the standard error stream."""
+    sys.stderr.write(message + '\n')
+    sys.stderr.flush()
+
+
+# --- PAYLOADS ---
+
+def write_synthetic_images(image_dir, count=4):
+    """Renders simple label images with OpenCV so the harness runs without real photos."""
+    import cv2
+    import numpy as np
+
+    brands = ['HOPWORKS', 'COLDCREEK', 'REDBARN', 'NORTHSTAR', 'BLUELINE', 'OAKHOUSE']
+    types = ['LAGER', 'IPA', 'STOUT', 'ALE']
+    for i in range(count):
+        image = np.full((1200, 900, 3), 255, np.uint8)
+        cv2.putText(image, brands[i % len(brands)], (60, 250), cv2.FONT_HERSHEY_SIMPLEX, 3, (0, 0, 0), 8)
+        cv2.putText(image, types[i % len(types)], (60, 450), cv2.FONT_HERSHEY_SIMPLEX, 2.5, (0, 0, 0), 6)
+        cv2.putText(image, f"{4 + i % 5}.{i % 10}% ALC/VOL", (60, 950), cv2.FONT_HERSHEY_SIMPLEX, 1.8, (0, 0, 0), 4)
+        cv2.putText(image, f"{12 + 4 * (i % 3)} FL OZ", (60, 1100), cv2.FONT_HERSHEY_SIMPLEX, 1.8, (0, 0, 0), 4)
+        cv2.imwrite(os.path.join(image_dir, f"synthetic{i}.png"), image)
+
+
+def synthetic_payloads(file_ids):
+    """Builds one webhook payload per image in the same '|'-joined layout Apps Script sends."""
+    payloads = []
+    for row, file_id in enumerate(file_ids, start=2):
+        fields = [f"field{i}" for i in range(IMAGE_LINK_INDEX)]
+        fields.append(f"https://drive.google.com/open?id={file_id}")
+        payloads.append({'row': row, 'data': '|'.join(fields)})
+    return payloads
+
+
+def load_payloads(path):
+    """Reads recorded payloads, one JSON object with 'row' and 'data' keys per line."""
+    payloads = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            payload = json.loads(line)
+            if 'row' not in payload or 'data' not in payload:
+                raise ValueError(f"{path}:{line_number}: expected 'row' and 'data' keys")
+            payloads.append({'row': payload['row'], 'data': payload['data']})
+    if not payloads:
+        raise ValueError(f"No payloads found in {path}")
+    return payloads
+
+
+# --- TARGETS ---
+
+def classify_response(status, body):
+    """Maps a webhook response to 'ok' or 'error'.
+
+    The hook answers 200 even when the pipeline fails, so the message text
+    is checked as well as the status code.
+    """
+    if status != 200:
+        return 'error'
+    try:
+        message = json.loads(body).get('message', '')
+    except (ValueError, AttributeError):
+        return 'error'
+    if message.startswith('Processing failed') or message.startswith('ERROR'):
+        return 'error'
+    return 'ok'
+
+
+def make_inprocess_sender(drive_endpoint):
+    """Imports app:app against the fake Drive server and posts through the Flask test client.
+
+    Each request runs on its own daemon thread so the timeout can be enforced;
+    a request that never returns is abandoned instead of pinning the load
+    generator (or interpreter shutdown) forever.
+    """
+    os.environ['DRIVE_API_ENDPOINT'] = drive_endpoint
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from app import app
+
+    def send(payload, timeout):
+        result = {}
+
+        def call():
+            try:
+                response = app.test_client().post(HOOK_PATH, data=json.dumps(payload),
+                                                  content_type='application/json')
+                result['response'] = (response.status_code, response.get_data(as_text=True))
+            except Exception as e:
+                result['error'] = e
+
+        worker = threading.Thread(target=call, daemon=True)
+        worker.start()
+        worker.join(timeout)
+        if worker.is_alive():
+            raise TimeoutError(f"in-process request exceeded {timeout:g}s")
+        if 'error' in result:
+            raise result['error']
+        return result['response']
+
+    return send
+
+
+def make_http_sender(base_url):
+    """Posts payloads over HTTP to a running server (gunicorn or an existing deployment)."""
+    url = base_url.rstrip('/') + HOOK_PATH
+
+    def send(payload, timeout):
+        data = json.dumps(payload).encode()
+        req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as response:
+                return response.status, response.read().decode()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode()
+
+    return send
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def log_tail(path, lines=20):
+    with open(path, errors='replace') as f:
+        return ''.join(f.readlines()[-lines:])
+
+
+def start_gunicorn(workers, threads, drive_endpoint, timeout, log_dir, startup_timeout=60):
+    """Launches gunicorn on a free local port and waits until it accepts connections.
+
+    gunicorn's output (including the app's stderr logging) goes to a log file
+    in log_dir; its tail is included in the error if startup fails.
+    """
+    port = free_port()
+    env = dict(os.environ, DRIVE_API_ENDPOINT=drive_endpoint)
+    cmd = [sys.executable, '-m', 'gunicorn', '--bind', f"127.0.0.1:{port}",
+           '--workers', str(workers), '--threads', str(threads),
+           '--timeout', str(int(timeout) + 30), 'app:app']
+    log_path = os.path.join(log_dir, f"gunicorn_{workers}x{threads}.log")
+    with open(log_path, 'w') as log_file:
+        process = subprocess.Popen(cmd, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                   stdout=log_file, stderr=subprocess.STDOUT)
+    log_message(f"DEBUG: gunicorn --workers {workers} --threads {threads} logging to {log_path}")
+
+    deadline = time.monotonic() + startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited during startup with code {process.returncode}. "
+                               f"Last lines of {log_path}:\n{log_tail(log_path)}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.2)
+
+    stop_gunicorn(process)
+    raise RuntimeError(f"gunicorn did not start within {startup_timeout}s. "
+                       f"Last lines of {log_path}:\n{log_tail(log_path)}")
+
+
+def stop_gunicorn(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+# --- OPEN-LOOP LOAD GENERATOR ---
+
+def arrival_schedule(rate, duration, arrival, rng):
+    """Returns send offsets (seconds from start) for the given rate.
+
+    'poisson' draws exponential inter-arrival gaps; 'uniform' spaces
+    requests evenly at 1/rate.
+    """
+    offsets = []
+    t = 0.0
+    while True:
+        t += rng.expovariate(rate) if arrival == 'poisson' else 1.0 / rate
+        if t >= duration:
+            return offsets
+        offsets.append(t)
+
+
+def warm_up(send, payloads, duration, concurrency, timeout):
+    """Sends unmeasured requests back-to-back from `concurrency` threads for `duration` seconds.
+
+    This pays for gunicorn worker imports, per-thread Drive client builds and
+    first-call Tesseract start-up before anything is timed, so they do not
+    land in the first rate's p99 and saturation verdict.
+    """
+    if duration <= 0:
+        return
+    deadline = time.monotonic() + duration
+
+    def loop(offset):
+        index = offset
+        while time.monotonic() < deadline:
+            try:
+                send(payloads[index % len(payloads)], timeout)
+            except Exception:
+                pass
+            index += concurrency
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(loop, range(concurrency)))
+
+
+def run_load(send, payloads, rate, duration, timeout, arrival='poisson', max_inflight=256, seed=0):
+    """Fires payloads on a fixed schedule regardless of how fast responses come back.
+
+    Latency is measured from each request's scheduled send time, so queueing
+    inside the client (when max_inflight is exhausted) still counts against
+    the server instead of hiding behind it.
+    """
+    rng = random.Random(seed)
+    offsets = arrival_schedule(rate, duration, arrival, rng)
+    results = []
+    results_lock = threading.Lock()
+
+    def fire(index, scheduled):
+        payload = payloads[index % len(payloads)]
+        try:
+            status, body = send(payload, timeout)
+            outcome = classify_response(status, body)
+        except (socket.timeout, TimeoutError):
+            outcome = 'timeout'
+        except urllib.error.URLError as e:
+            outcome = 'timeout' if isinstance(e.reason, (socket.timeout, TimeoutError)) else 'error'
+        except Exception:
+            outcome = 'error'
+        finished = time.monotonic()
+        latency = finished - scheduled
+        if outcome == 'ok' and latency > timeout:
+            outcome = 'timeout'
+        with results_lock:
+            results.append((outcome, latency, finished))
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max_inflight) as pool:
+        for index, offset in enumerate(offsets):
+            scheduled = start + offset
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(fire, index, scheduled)
+
+    return summarize(results, rate, duration, start)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list; None when empty."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(results, rate, duration, start):
+    """Reduces (outcome, latency, finished) tuples from one run to a report row.
+
+    sent_rps and throughput_rps are both measured over the second half of
+    the send window: requests scheduled in it versus ok responses finished in
+    it. Without queueing the two match once latency is below duration / 2,
+    so a slow-but-keeping-up server is not mistaken for a saturated one.
+
+    p50..p99 cover ok responses only; p99_all_ms and max_ms also include
+    timed-out requests, which are the slowest ones under overload.
+    """
+    total = len(results)
+    ok_latencies = sorted(latency for outcome, latency, _ in results if outcome == 'ok')
+    slow_latencies = sorted(latency for outcome, latency, _ in results if outcome in ('ok', 'timeout'))
+    errors = sum(1 for outcome, _, _ in results if outcome == 'error')
+    timeouts = sum(1 for outcome, _, _ in results if outcome == 'timeout')
+
+    window_start = start + duration / 2
+    window_end = start + duration
+    window = window_end - window_start
+    window_sent = sum(1 for _, latency, finished in results
+                      if window_start <= finished - latency < window_end)
+    window_ok = sum(1 for outcome, _, finished in results
+                    if outcome == 'ok' and window_start <= finished < window_end)
+
+    return {
+        'offered_rps': rate,
+        'sent': total,
+        'sent_rps': window_sent / window if window else 0.0,
+        'ok': len(ok_latencies),
+        'error_rate': errors / total if total else 0.0,
+        'timeout_rate': timeouts / total if total else 0.0,
+        'throughput_rps': window_ok / window if window else 0.0,
+        'p50_ms': _ms(percentile(ok_latencies, 50)),
+        'p90_ms': _ms(percentile(ok_latencies, 90)),
+        'p95_ms': _ms(percentile(ok_latencies, 95)),
+        'p99_ms': _ms(percentile(ok_latencies, 99)),
+        'p99_all_ms': _ms(percentile(slow_latencies, 99)),
+        'max_ms': _ms(slow_latencies[-1] if slow_latencies else None),
+        'duration_s': duration,
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def is_saturated(summary, max_error_rate):
+    """A rate is saturated once throughput falls behind the send rate or failures climb.
+
+    Throughput is compared with what was actually sent over the same interval,
+    not the nominal rate, since a Poisson schedule rarely lands on exactly
+    rate * duration requests.
+    """
+    failure_rate = summary['error_rate'] + summary['timeout_rate']
+    return summary['throughput_rps'] < 0.9 * summary['sent_rps'] or failure_rate > max_error_rate
+
+
+# --- REPORTING ---
+
+def highest_sustainable(summaries, max_error_rate):
+    """Largest offered rate below the first saturated one, or None.
+
+    Rates are taken in ascending order, so a lucky pass at a higher rate after
+    a saturated one is not reported as sustainable.
+    """
+    best = None
+    for summary in sorted(summaries, key=lambda s: s['offered_rps']):
+        if is_saturated(summary, max_error_rate):
+            break
+        best = summary
+    return best
+
+
+def print_report(label, summaries, max_error_rate):
+    header = (f"{'offered':>8} {'sent':>6} {'tput':>7} {'err%':>6} {'tmo%':>6} {'p50':>8} {'p90':>8} "
+              f"{'p95':>8} {'p99':>8} {'p99all':>8} {'max':>8}")
+    print(f"\n=== {label} ===")
+    print(header)
+    summaries = sorted(summaries, key=lambda s: s['offered_rps'])
+    for s in summaries:
+        flag = '  SATURATED' if is_saturated(s, max_error_rate) else ''
+        print(f"{s['offered_rps']:>8g} {s['sent']:>6} {s['throughput_rps']:>7.2f} "
+              f"{100 * s['error_rate']:>6.1f} {100 * s['timeout_rate']:>6.1f} "
+              f"{_fmt(s['p50_ms'])} {_fmt(s['p90_ms'])} {_fmt(s['p95_ms'])} {_fmt(s['p99_ms'])} "
+              f"{_fmt(s['p99_all_ms'])} {_fmt(s['max_ms'])}{flag}")
+        if s['p50_ms'] is not None and s['p50_ms'] > 1000 * s['duration_s'] / 2:
+            print(f"{'':>8} note: p50 exceeds half of --duration; throughput is understated, raise --duration")
+
+    peak = max(summaries, key=lambda s: s['throughput_rps'])
+    best = highest_sustainable(summaries, max_error_rate)
+    print(f"Peak throughput: {peak['throughput_rps']:.2f} req/s (offered {peak['offered_rps']:g})")
+    if best:
+        print(f"Highest sustainable rate: {best['offered_rps']:g} req/s "
+              f"(p99 {_fmt(best['p99_ms']).strip()} ms)")
+    else:
+        print("Highest sustainable rate: none (saturated at the lowest offered rate)")
+
+
+def _fmt(value):
+    return f"{'-':>8}" if value is None else f"{value:>8.1f}"
+
+
+def parse_configs(text):
+    configs = []
+    for item in text.split(','):
+        workers, threads = item.lower().split('x')
+        configs.append((int(workers), int(threads)))
+    return configs
+
+
+# --- MAIN EXECUTION BLOCK ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Open-loop load test for the Flask webhook.')
+    parser.add_argument('--mode', choices=['inprocess', 'gunicorn', 'url'], default='inprocess')
+    parser.add_argument('--url', help="Base URL of an already running server (for --mode url)")
+    parser.add_argument('--configs', default='1x8', help="gunicorn WORKERSxTHREADS list, e.g. 1x8,2x4")
+    parser.add_argument('--rates', default='1,2,4', help="Comma-separated offered rates in req/s")
+    parser.add_argument('--duration', type=float, default=30, help="Seconds of load per rate")
+    parser.add_argument('--arrival', choices=['poisson', 'uniform'], default='poisson')
+    parser.add_argument('--timeout', type=float, default=30, help="Per-request timeout in seconds (all modes)")
+    parser.add_argument('--warmup', type=float, default=10, help="Unmeasured warm-up seconds before each sweep")
+    parser.add_argument('--warmup-concurrency', type=int, default=8,
+                        help="Warm-up threads for inprocess/url modes (gunicorn uses workers * threads)")
+    parser.add_argument('--max-inflight', type=int, default=256, help="Client-side concurrency cap")
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help="Failure rate that marks saturation")
+    parser.add_argument('--payloads', help="JSONL file of recorded {row, data} payloads (required for --mode url)")
+    parser.add_argument('--images', help="Directory of label images for the fake Drive server")
+    parser.add_argument('--drive-latency-ms', type=float, default=150)
+    parser.add_argument('--drive-jitter-ms', type=float, default=50)
+    parser.add_argument('--drive-error-rate', type=float, default=0.0)
+    parser.add_argument('--json-out', help="Write all summaries to this JSON file")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.mode == 'url':
+        # A remote deployment downloads from real Drive, so neither the local
+        # fake server nor its synthetic file IDs are any use there.
+        if not args.url:
+            parser.error('--mode url requires --url')
+        if not args.payloads:
+            parser.error('--mode url requires --payloads')
+
+    rates = [float(r) for r in args.rates.split(',')]
+
+    drive = None
+    if args.mode != 'url':
+        image_dir = args.images
+        if image_dir is None:
+            image_dir = tempfile.mkdtemp(prefix='ttb_load_')
+            write_synthetic_images(image_dir)
+            log_message(f"DEBUG: Wrote synthetic label images to {image_dir}")
+
+        drive = FakeDriveServer(image_dir, args.drive_latency_ms, args.drive_jitter_ms,
+                                args.drive_error_rate).start()
+        log_message(f"DEBUG: Fake Drive server listening at {drive.endpoint}")
+
+    payloads = load_payloads(args.payloads) if args.payloads else synthetic_payloads(list(drive.images))
+
+    def sweep(send, label, warmup_concurrency):
+        log_message(f"DEBUG: {label}: warming up for {args.warmup:g}s with {warmup_concurrency} threads")
+        warm_up(send, payloads, args.warmup, warmup_concurrency, args.timeout)
+        summaries = []
+        for rate in rates:
+            log_message(f"DEBUG: {label}: offering {rate:g} req/s for {args.duration:g}s")
+            summaries.append(run_load(send, payloads, rate, args.duration, args.timeout,
+                                      args.arrival, args.max_inflight, args.seed))
+        print_report(label, summaries, args.max_error_rate)
+        return {'target': label, 'results': summaries}
+
+    reports = []
+    try:
+        if args.mode == 'inprocess':
+            reports.append(sweep(make_inprocess_sender(drive.endpoint), 'in-process', args.warmup_concurrency))
+        elif args.mode == 'url':
+            reports.append(sweep(make_http_sender(args.url), args.url, args.warmup_concurrency))
+        else:
+            log_dir = tempfile.mkdtemp(prefix='ttb_gunicorn_')
+            for workers, threads in parse_configs(args.configs):
+                process, base_url = start_gunicorn(workers, threads, drive.endpoint, args.timeout, log_dir)
+                try:
+                    reports.append(sweep(make_http_sender(base_url), f"gunicorn --workers {workers} --threads {threads}",
+                                         workers * threads))
+                finally:
+                    stop_gunicorn(process)
+    finally:
+        if drive is not None:
+            drive.shutdown()
+            drive.server_close()
+
+    if args.json_out:
+        with open(args.json_out, 'w') as f:
+            json.dump(reports, f, indent=2)
+        log_message(f"DEBUG: Wrote results to {args.json_out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+"""
+Tests for drive_ingest.py against the local Drive stand-in (fake_drive.py).
+
+The Drive client is the real googleapiclient service from app.py, pointed at
+FakeDriveServer; only the CV/OCR pipeline (process_drive_image) is patched.
+
+Run with:
+    python -m unittest test_drive_ingest
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+# app.py picks its credentials at import time; the endpoint override selects
+# anonymous credentials. Each test points the client at its own fake server.
+os.environ.setdefault('DRIVE_API_ENDPOINT', 'http://127.0.0.1:9/drive/v3/')
+
+import app
+import drive_ingest
+from fake_drive import FakeDriveServer
+
+FOLDER_ID = 'uploads'
+
+
+class DriveIngestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix='ttb_ingest_test_')
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.image_dir = os.path.join(self.tmp, 'images')
+        self.state_path = os.path.join(self.tmp, 'state.json')
+        os.mkdir(self.image_dir)
+        self.mtime = time.time() - 1000
+        for name in ('img1.png', 'img2.png', 'img3.png'):
+            self.add_image(name)
+
+        self.drive = FakeDriveServer(self.image_dir, folder_id=FOLDER_ID).start()
+        self.addCleanup(self.drive.server_close)
+        self.addCleanup(self.drive.shutdown)
+
+        # Fresh per-thread services bound to this test's fake server
+        for patcher in (mock.patch.object(app, 'DRIVE_CLIENT_OPTIONS', {'api_endpoint': self.drive.endpoint}),
+                        mock.patch.object(app, '_drive_local', threading.local())):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.calls = []
+        self.failing = set()
+        patcher = mock.patch.object(drive_ingest, 'process_drive_image', self.fake_pipeline)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.pool = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(self.pool.shutdown)
+
+    def add_image(self, name):
+        """Writes an image with a strictly increasing modifiedTime."""
+        path = os.path.join(self.image_dir, name)
+        with open(path, 'wb') as f:
+            f.write(b'not really a png')
+        self.mtime += 1
+        os.utime(path, (self.mtime, self.mtime))
+
+    def fake_pipeline(self, file_id):
+        self.calls.append(file_id)
+        if file_id in self.failing:
+            raise ValueError('pipeline failure')
+        return {'brand': 'TEST', 'abv': 5.0}
+
+    def poll(self, mode, max_attempts=3, **kwargs):
+        state = drive_ingest.IngestState(self.state_path)
+        drive_ingest.run_once(mode, state, FOLDER_ID, 2, self.pool, max_attempts, **kwargs)
+        return state
+
+    def test_folder_mode_checkpoints_and_skips_processed(self):
+        state = self.poll('folder')
+        self.assertEqual(sorted(self.calls), ['img1', 'img2', 'img3'])
+        # Only the ID at the modifiedTime checkpoint is needed for the '>=' dedupe
+        self.assertEqual(set(state.processed), {'img3'})
+        self.assertEqual(state.processed['img3'], state.modified_since)
+
+        # A restart reloads the checkpoint from disk
+        reloaded = drive_ingest.IngestState(self.state_path)
+        self.assertEqual(reloaded.processed, state.processed)
+        self.assertEqual(reloaded.modified_since, state.modified_since)
+        self.assertIsNotNone(reloaded.page_token)
+
+        self.calls.clear()
+        self.poll('folder')
+        self.assertEqual(self.calls, [])
+
+        self.add_image('img4.png')
+        self.poll('folder')
+        self.assertEqual(self.calls, ['img4'])
+
+    def test_changes_mode_starts_at_current_position(self):
+        state = self.poll('changes')
+        self.assertEqual(self.calls, [])
+        self.assertIsNotNone(drive_ingest.IngestState(self.state_path).page_token)
+
+        self.add_image('img4.png')
+        self.add_image('img5.png')
+        state = self.poll('changes')
+        self.assertEqual(sorted(self.calls), ['img4', 'img5'])
+
+        self.calls.clear()
+        self.poll('changes')
+        self.assertEqual(self.calls, [])
+        self.assertEqual(drive_ingest.IngestState(self.state_path).page_token, state.page_token)
+
+    def test_folder_backfill_then_changes_has_no_gap(self):
+        self.poll('folder')
+        self.calls.clear()
+
+        # Uploaded after the backfill but before the first changes-mode poll
+        self.add_image('img4.png')
+        self.poll('changes')
+        self.assertEqual(self.calls, ['img4'])
+
+    def test_changes_mode_prunes_outside_dedupe_window(self):
+        self.poll('changes')
+        for name in ('img4.png', 'img5.png', 'img6.png'):
+            self.add_image(name)
+
+        # Files are 1 s apart, so a 1.5 s window keeps only img5 and img6
+        state = self.poll('changes', dedupe_window_hours=1.5 / 3600)
+        self.assertEqual(sorted(self.calls), ['img4', 'img5', 'img6'])
+        self.assertEqual(set(state.processed), {'img5', 'img6'})
+
+        # A later change to img4 that keeps its modifiedTime (e.g. a rename) is ignored
+        self.drive.change_log.append('img4')
+        self.calls.clear()
+        self.poll('changes', dedupe_window_hours=1.5 / 3600)
+        self.assertEqual(self.calls, [])
+
+    def test_failed_file_is_retried_once_per_poll_then_given_up(self):
+        # The newest upload fails, so its modifiedTime equals the checkpoint
+        # and the '>=' listing returns it on every poll.
+        self.failing.add('img3')
+
+        state = self.poll('folder')
+        self.assertEqual(self.calls.count('img3'), 1)
+        self.assertEqual(state.failed['img3']['attempts'], 1)
+
+        state = self.poll('folder')
+        self.assertEqual(self.calls.count('img3'), 2)
+        self.assertEqual(state.failed['img3']['attempts'], 2)
+
+        state = self.poll('folder')
+        self.assertEqual(self.calls.count('img3'), 3)
+        self.assertEqual(state.failed, {})
+        self.assertNotIn('img3', state.processed)
+        self.assertEqual(state.given_up['img3']['attempts'], 3)
+
+        self.poll('folder')
+        self.assertEqual(self.calls.count('img3'), 3)
+
+        # Re-driving gives it a fresh set of attempts
+        self.failing.clear()
+        state = drive_ingest.IngestState(self.state_path)
+        self.assertEqual(state.redrive_given_up(), 1)
+        state.save()
+        state = self.poll('folder')
+        self.assertEqual(self.calls.count('img3'), 4)
+        self.assertEqual(state.given_up, {})
+        self.assertIn('img3', state.processed)
+
+    def test_retry_succeeds_after_transient_failure(self):
+        self.failing.add('img3')
+        self.poll('folder')
+        self.failing.clear()
+
+        state = self.poll('folder')
+        self.assertEqual(self.calls.count('img3'), 2)
+        self.assertEqual(state.failed, {})
+        # The retried file keeps its modifiedTime, so the checkpoint dedupe still covers it
+        self.assertEqual(state.processed['img3'], state.modified_since)
+
+        self.poll('folder')
+        self.assertEqual(self.calls.count('img3'), 2)
+
+    def test_folder_id_is_required_in_every_mode(self):
+        for mode in ('changes', 'folder'):
+            result = subprocess.run([sys.executable, 'drive_ingest.py', '--mode', mode, '--once'],
+                                    cwd=os.path.dirname(os.path.abspath(__file__)),
+                                    capture_output=True, text=True)
+            self.assertEqual(result.returncode, 2)
+            self.assertIn('--folder-id', result.stderr)
+
+    def test_file_names_that_need_url_encoding_are_served(self):
+        self.add_image('label 1.png')
+        self.add_image('a.b.png')
+
+        for file_id in ('label 1', 'a.b'):
+            metadata = app.get_drive_service().files().get(fileId=file_id).execute()
+            self.assertEqual(metadata['parents'], [FOLDER_ID])
+            self.assertEqual(app.download_image_to_buffer(file_id).getvalue(), b'not really a png')
+
+
+if __name__ == '__main__':
+    unittest.main()
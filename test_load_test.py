@@ -0,0 +1,133 @@
+"""
+Unit tests for the load_test.py report maths (no server or app import needed).
+
+Run with:
+    python -m unittest test_load_test
+"""
+import contextlib
+import io
+import random
+import unittest
+
+import load_test
+
+START = 1000.0
+
+
+def steady_results(rate, duration, latency, outcome='ok'):
+    """Uniform arrivals that each complete after a fixed latency (no queueing)."""
+    offsets = load_test.arrival_schedule(rate, duration, 'uniform', random.Random(0))
+    return [(outcome, latency, START + offset + latency) for offset in offsets]
+
+
+def summary_for(rate, saturated, p99_ms=100.0):
+    sent_rps = float(rate)
+    return {'offered_rps': rate, 'sent': int(rate * 10), 'sent_rps': sent_rps,
+            'throughput_rps': sent_rps * (0.5 if saturated else 1.0), 'ok': int(rate * 10),
+            'error_rate': 0.0, 'timeout_rate': 0.0, 'p50_ms': p99_ms, 'p90_ms': p99_ms,
+            'p95_ms': p99_ms, 'p99_ms': p99_ms, 'p99_all_ms': p99_ms, 'max_ms': p99_ms,
+            'duration_s': 10}
+
+
+class ArrivalScheduleTest(unittest.TestCase):
+
+    def test_uniform_spacing(self):
+        offsets = load_test.arrival_schedule(4, 2, 'uniform', random.Random(0))
+        self.assertEqual(len(offsets), 7)
+        self.assertAlmostEqual(offsets[0], 0.25)
+        self.assertTrue(all(abs(b - a - 0.25) < 1e-9 for a, b in zip(offsets, offsets[1:])))
+
+    def test_poisson_is_seeded_and_bounded(self):
+        first = load_test.arrival_schedule(20, 30, 'poisson', random.Random(7))
+        second = load_test.arrival_schedule(20, 30, 'poisson', random.Random(7))
+        self.assertEqual(first, second)
+        self.assertTrue(all(0 < t < 30 for t in first))
+        self.assertEqual(first, sorted(first))
+        self.assertAlmostEqual(len(first) / 30, 20, delta=2)
+
+
+class PercentileTest(unittest.TestCase):
+
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(load_test.percentile(values, 50), 50)
+        self.assertEqual(load_test.percentile(values, 99), 99)
+        self.assertEqual(load_test.percentile(values, 100), 100)
+        self.assertEqual(load_test.percentile([5], 99), 5)
+
+    def test_empty(self):
+        self.assertIsNone(load_test.percentile([], 50))
+
+
+class SummarizeTest(unittest.TestCase):
+
+    def test_high_latency_without_queueing_is_not_saturated(self):
+        # 2 s per request at 2 and 4 req/s over 10 s: slow, but keeping up
+        for rate in (2, 4):
+            summary = load_test.summarize(steady_results(rate, 10, 2.0), rate, 10, START)
+            self.assertAlmostEqual(summary['throughput_rps'], rate, delta=0.25)
+            self.assertAlmostEqual(summary['sent_rps'], rate, delta=0.25)
+            self.assertFalse(load_test.is_saturated(summary, 0.01))
+
+    def test_falling_behind_is_saturated(self):
+        # Server completes one request every 0.5 s while 4 req/s arrive
+        offsets = load_test.arrival_schedule(4, 10, 'uniform', random.Random(0))
+        results = [('ok', (i + 1) * 0.5 - offset, START + (i + 1) * 0.5) for i, offset in enumerate(offsets)]
+        summary = load_test.summarize(results, 4, 10, START)
+        self.assertAlmostEqual(summary['throughput_rps'], 2, delta=0.25)
+        self.assertTrue(load_test.is_saturated(summary, 0.01))
+
+    def test_failures_mark_saturation(self):
+        results = steady_results(2, 10, 0.1)
+        results[0] = ('error', 0.01, START + 0.51)
+        summary = load_test.summarize(results, 2, 10, START)
+        self.assertAlmostEqual(summary['error_rate'], 1 / len(results))
+        self.assertTrue(load_test.is_saturated(summary, 0.01))
+        self.assertFalse(load_test.is_saturated(summary, 0.1))
+
+    def test_timeouts_count_in_tail_latency(self):
+        results = steady_results(10, 10, 0.1)
+        for i in range(0, len(results), 10):
+            _, _, finished = results[i]
+            results[i] = ('timeout', 30.0, finished - 0.1 + 30.0)
+        summary = load_test.summarize(results, 10, 10, START)
+        self.assertEqual(summary['p99_ms'], 100.0)
+        self.assertEqual(summary['p99_all_ms'], 30000.0)
+        self.assertEqual(summary['max_ms'], 30000.0)
+        self.assertAlmostEqual(summary['timeout_rate'], 0.1, delta=0.01)
+
+    def test_empty_run(self):
+        summary = load_test.summarize([], 1, 10, START)
+        self.assertEqual(summary['sent'], 0)
+        self.assertIsNone(summary['p99_ms'])
+        self.assertEqual(summary['throughput_rps'], 0.0)
+
+
+class ReportTest(unittest.TestCase):
+
+    def test_highest_sustainable_stops_at_first_saturated_rate(self):
+        # Given out of order, with a noisy pass at 8 after 4 saturated
+        summaries = [summary_for(8, False), summary_for(2, False), summary_for(4, True), summary_for(1, False)]
+        self.assertEqual(load_test.highest_sustainable(summaries, 0.01)['offered_rps'], 2)
+
+    def test_highest_sustainable_none_when_lowest_rate_saturates(self):
+        self.assertIsNone(load_test.highest_sustainable([summary_for(1, True), summary_for(2, False)], 0.01))
+
+    def test_report_rows_are_sorted_by_rate(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            load_test.print_report('t', [summary_for(4, False), summary_for(1, False)], 0.01)
+        rows = [line.split()[0] for line in out.getvalue().splitlines()[3:5]]
+        self.assertEqual(rows, ['1', '4'])
+        self.assertIn('Highest sustainable rate: 4 req/s', out.getvalue())
+
+
+class ArgumentTest(unittest.TestCase):
+
+    def test_url_mode_requires_payloads(self):
+        with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            load_test.main(['--mode', 'url', '--url', 'http://127.0.0.1:9'])
+
+
+if __name__ == '__main__':
+    unittest.main()